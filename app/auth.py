@@ -2,7 +2,9 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
+from cachetools import TTLCache
 import os
+import time
 
 SECRET_KEY = os.getenv("SECRET_KEY", "5126d5cd1cf5da394dde90cac78a1389d511eacdea7022f32651743a891f5524")
 ALGORITHM = "HS256"
@@ -10,6 +12,9 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# Проверенные токены: повторные запросы с тем же cookie не проверяют подпись
+token_cache = TTLCache(maxsize=10_000, ttl=60)
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
@@ -35,4 +40,15 @@ def decode_token(token: str):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+
+def decode_token_cached(token: str):
+    payload = token_cache.get(token)
+    if payload is not None and payload.get("exp", 0) > time.time():
+        return payload
+
+    payload = decode_token(token)
+    if payload:
+        token_cache[token] = payload
+    return payload
\ No newline at end of file
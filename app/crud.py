@@ -1,61 +1,144 @@
-from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import datetime
+from typing import NamedTuple, Optional
+from sqlalchemy import select, insert, update, delete, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
-from .models import User, Album
+from starlette.concurrency import run_in_threadpool
+from .models import User, Album, album_search_vector, SEARCH_CONFIG
 from .auth import get_password_hash, verify_password
 
 
 # ===== CRUD для пользователей =====
 
-def get_user_by_email(db: Session, email: str):
-    return db.query(User).filter(User.email == email).first()
-
-
-def get_user_by_username(db: Session, username: str):
-    return db.query(User).filter(User.username == username).first()
-
-
-def create_user(db: Session, email: str, username: str, password: str):
-    if get_user_by_email(db, email) or get_user_by_username(db, username):
+async def create_user(db: AsyncSession, email: str, username: str, password: str):
+    # bcrypt нагружает CPU, поэтому хэшируем вне event loop
+    hashed_password = await run_in_threadpool(get_password_hash, password)
+
+    values = {
+        "email": email,
+        "username": username,
+        "hashed_password": hashed_password
+    }
+
+    # Один INSERT ... ON CONFLICT DO NOTHING RETURNING вместо проверки через
+    # два SELECT: уникальность email/username гарантируют индексы таблицы.
+    # Для остальных СУБД дубликат определяется по IntegrityError
+    dialect_name = db.bind.dialect.name
+    if dialect_name == "postgresql":
+        stmt = pg_insert(User).values(**values).on_conflict_do_nothing()
+    elif dialect_name == "sqlite":
+        stmt = sqlite_insert(User).values(**values).on_conflict_do_nothing()
+    else:
+        stmt = insert(User).values(**values)
+
+    try:
+        result = await db.execute(stmt.returning(User))
+        db_user = result.scalars().first()
+    except IntegrityError:
+        db_user = None
+
+    if not db_user:
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail="Пользователь с таким email или username уже существует"
         )
 
-    hashed_password = get_password_hash(password)
-    db_user = User(
-        email=email,
-        username=username,
-        hashed_password=hashed_password
-    )
-
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    invalidate_user_cache(db_user.username)
     return db_user
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user_by_username(db, username)
-    if not user:
+async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[int]:
+    """Возвращает id пользователя при верном пароле, иначе None"""
+    result = await db.execute(
+        select(User.id, User.hashed_password).where(User.username == username)
+    )
+    row = result.first()
+    if not row:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await run_in_threadpool(verify_password, password, row.hashed_password):
         return None
+    return row.id
+
+
+# ===== Кэш текущего пользователя =====
+
+class CachedUser(NamedTuple):
+    """Данные пользователя для авторизованных запросов (без привязки к сессии)"""
+    id: int
+    email: str
+    username: str
+    created_at: datetime
+
+
+USER_CACHE_SIZE = 1024
+_user_cache: "OrderedDict[str, CachedUser]" = OrderedDict()
+
+
+async def get_cached_user(db: AsyncSession, username: str) -> Optional[CachedUser]:
+    user = _user_cache.get(username)
+    if user is not None:
+        _user_cache.move_to_end(username)
+        return user
+
+    result = await db.execute(
+        select(User.id, User.email, User.username, User.created_at).where(User.username == username)
+    )
+    row = result.first()
+    if not row:
+        return None
+
+    user = CachedUser(*row)
+    _user_cache[username] = user
+    if len(_user_cache) > USER_CACHE_SIZE:
+        _user_cache.popitem(last=False)
     return user
 
 
+def invalidate_user_cache(username: str):
+    _user_cache.pop(username, None)
+
+
 # ===== CRUD для альбомов =====
 
-def get_albums(db: Session, user_id: int, skip: int = 0, limit: int = 100):
-    return db.query(Album).filter(
-        Album.owner_id == user_id
-    ).order_by(Album.created_at.desc()).offset(skip).limit(limit).all()
+# Колонки, которые выводит список альбомов (albums.html); notes, barcode
+# и прочие поля карточки альбома для списка не загружаются
+ALBUM_LIST_COLUMNS = (
+    Album.id, Album.title, Album.artist, Album.genre,
+    Album.release_year, Album.created_at
+)
 
 
-def get_album_by_id(db: Session, album_id: int, user_id: int):
-    album = db.query(Album).filter(
-        Album.id == album_id,
-        Album.owner_id == user_id
-    ).first()
+async def get_albums(db: AsyncSession, user_id: int, skip: int = 0, limit: int = 100):
+    result = await db.execute(
+        select(*ALBUM_LIST_COLUMNS).where(
+            Album.owner_id == user_id
+        ).order_by(Album.created_at.desc()).offset(skip).limit(limit)
+    )
+    return result.all()
+
+
+async def get_albums_version(db: AsyncSession, user_id: int):
+    """Время последнего изменения и количество альбомов пользователя (для ETag)"""
+    result = await db.execute(
+        select(func.max(Album.updated_at), func.count()).where(Album.owner_id == user_id)
+    )
+    return result.one()
+
+
+async def get_album_by_id(db: AsyncSession, album_id: int, user_id: int):
+    result = await db.execute(
+        select(Album).where(
+            Album.id == album_id,
+            Album.owner_id == user_id
+        )
+    )
+    album = result.scalars().first()
 
     if not album:
         raise HTTPException(status_code=404, detail="Альбом не найден")
@@ -63,37 +146,69 @@ def get_album_by_id(db: Session, album_id: int, user_id: int):
     return album
 
 
-def create_album(db: Session, user_id: int, **album_data):
-    db_album = Album(owner_id=user_id, **album_data)
-    db.add(db_album)
-    db.commit()
-    db.refresh(db_album)
+async def create_album(db: AsyncSession, user_id: int, **album_data):
+    result = await db.execute(
+        insert(Album).values(owner_id=user_id, **album_data).returning(Album)
+    )
+    db_album = result.scalars().one()
+    await db.commit()
     return db_album
 
 
-def update_album(db: Session, album_id: int, user_id: int, **album_data):
-    album = get_album_by_id(db, album_id, user_id)
+async def update_album(db: AsyncSession, album_id: int, user_id: int, **album_data):
+    values = {key: value for key, value in album_data.items() if value is not None}
+    if not values:
+        return await get_album_by_id(db, album_id, user_id)
+
+    result = await db.execute(
+        update(Album).where(
+            Album.id == album_id,
+            Album.owner_id == user_id
+        ).values(**values).returning(Album)
+    )
+    album = result.scalars().first()
 
-    for key, value in album_data.items():
-        if value is not None:
-            setattr(album, key, value)
+    if not album:
+        raise HTTPException(status_code=404, detail="Альбом не найден")
 
-    db.commit()
-    db.refresh(album)
+    await db.commit()
     return album
 
 
-def delete_album(db: Session, album_id: int, user_id: int):
-    album = get_album_by_id(db, album_id, user_id)
-    db.delete(album)
-    db.commit()
+async def delete_album(db: AsyncSession, album_id: int, user_id: int):
+    result = await db.execute(
+        delete(Album).where(
+            Album.id == album_id,
+            Album.owner_id == user_id
+        )
+    )
+
+    if result.rowcount == 0:
+        raise HTTPException(status_code=404, detail="Альбом не найден")
+
+    await db.commit()
     return True
 
 
-def search_albums(db: Session, user_id: int, query: str):
-    return db.query(Album).filter(
-        Album.owner_id == user_id,
-        (Album.title.ilike(f"%{query}%")) |
-        (Album.artist.ilike(f"%{query}%")) |
-        (Album.genre.ilike(f"%{query}%"))
-    ).all()
\ No newline at end of file
+async def search_albums(db: AsyncSession, user_id: int, query: str):
+    # Полнотекстовый поиск по GIN-индексу (PostgreSQL); ILIKE остаётся
+    # для SQLite и для запросов с ведущим шаблоном вида "%road"
+    if db.bind.dialect.name == "postgresql" and not query.startswith("%"):
+        ts_query = func.plainto_tsquery(SEARCH_CONFIG, query)
+        result = await db.execute(
+            select(*ALBUM_LIST_COLUMNS).where(
+                Album.owner_id == user_id,
+                album_search_vector.op("@@")(ts_query)
+            ).order_by(func.ts_rank(album_search_vector, ts_query).desc())
+        )
+        return result.all()
+
+    result = await db.execute(
+        select(*ALBUM_LIST_COLUMNS).where(
+            Album.owner_id == user_id,
+            (Album.title.ilike(f"%{query}%")) |
+            (Album.artist.ilike(f"%{query}%")) |
+            (Album.genre.ilike(f"%{query}%"))
+        )
+    )
+    return result.all()
\ No newline at end of file
@@ -1,52 +1,119 @@
 from fastapi import FastAPI, Depends, HTTPException, Request, Form, status
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.exceptions import RequestValidationError
-from sqlalchemy.orm import Session
+from starlette.exceptions import HTTPException as StarletteHTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
+from contextlib import asynccontextmanager
+import hashlib
 import logging
 import os
+import re
+import time
+from jinja2 import FileSystemBytecodeCache
 from datetime import datetime, timedelta
 
-from .database import engine, get_db, Base
-from .models import User
-from .auth import create_access_token, decode_token, ACCESS_TOKEN_EXPIRE_MINUTES, get_password_hash, verify_password
+from .database import get_db
+from .auth import create_access_token, decode_token_cached, ACCESS_TOKEN_EXPIRE_MINUTES
 from .crud import (
-    get_user_by_email, get_user_by_username, get_albums,
+    authenticate_user, create_user, get_albums,
     get_album_by_id, create_album, update_album, delete_album,
-    search_albums
+    search_albums, get_cached_user, get_albums_version
 )
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-try:
-    Base.metadata.create_all(bind=engine)
-    logger.info("Таблицы базы данных созданы успешно")
-except Exception as e:
-    logger.error(f"Ошибка создания таблиц: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Шаблоны компилируются при старте, а не на первом запросе
+    for name in PRELOADED_TEMPLATES:
+        templates.get_template(name)
+    yield
+
 
 app = FastAPI(
     title="Vinyl Collection Manager",
-    description="Веб-интерфейс для управления коллекцией виниловых пластинок"
+    description="Веб-интерфейс для управления коллекцией виниловых пластинок",
+    lifespan=lifespan
 )
 
-os.makedirs("app/static", exist_ok=True)
-os.makedirs("app/templates", exist_ok=True)
+# Каталоги приложения не зависят от текущей рабочей директории
+STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+# Режим разработки (ENV=dev): шаблоны перечитываются при изменении файлов
+DEV_MODE = os.getenv("ENV") == "dev"
+
+if DEV_MODE:
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    os.makedirs(TEMPLATES_DIR, exist_ok=True)
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory="app/templates")
+# Каталог для кэша байткода шаблонов (необязательно): TEMPLATE_CACHE_DIR
+TEMPLATE_CACHE_DIR = os.getenv("TEMPLATE_CACHE_DIR")
+if TEMPLATE_CACHE_DIR:
+    os.makedirs(TEMPLATE_CACHE_DIR, exist_ok=True)
 
-SYSTEM_PATHS = {"/favicon.ico", "/docs", "/redoc", "/openapi.json"}
+app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+templates = Jinja2Templates(
+    directory=TEMPLATES_DIR,
+    auto_reload=DEV_MODE,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache(TEMPLATE_CACHE_DIR) if TEMPLATE_CACHE_DIR else None
+)
+
+# Размер блока (в символах) при потоковой отдаче страниц
+STREAM_CHUNK_SIZE = 16 * 1024
+
+# Версия разметки страницы альбомов для ETag: меняется вместе с шаблонами,
+# чтобы после деплоя клиенты не получали 304 со старым HTML
+ALBUMS_PAGE_VERSION = hashlib.md5("".join(
+    templates.env.loader.get_source(templates.env, name)[0]
+    for name in ("base.html", "albums.html")
+).encode()).hexdigest()
+
+PRELOADED_TEMPLATES = (
+    "index.html", "login.html", "register.html",
+    "albums.html", "album_detail.html", "error.html"
+)
+
+SYSTEM_PATHS = frozenset({"/favicon.ico", "/docs", "/redoc", "/openapi.json"})
+
+# Шаблон для ошибок валидации по префиксу пути запроса
+VALIDATION_ERROR_TEMPLATES = (
+    ("/register", "register.html"),
+    ("/login", "login.html"),
+    ("/albums", "album_detail.html"),
+)
+
+EMAIL_RE = re.compile(r"[^@\s]+@[^@\s]+\.[^@\s]+")
+
+# Текущий год для проверки года выпуска; пересчитывается при смене года
+_current_year = datetime.now().year
+_next_year_starts_at = datetime(_current_year + 1, 1, 1).timestamp()
 
 
 # ===== ОБРАБОТКА ОШИБОК =====
 
+def render_error(request: Request, status_code: int, error: str, template_name: str = "error.html"):
+    if request.scope["path"] in SYSTEM_PATHS:
+        return JSONResponse(status_code=404, content={"detail": "Not found"})
+
+    return templates.TemplateResponse(template_name, {
+        "request": request,
+        "error": error,
+        "status_code": status_code,
+        "now": datetime.now()
+    }, status_code=status_code)
+
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
 
-    if request.url.path in SYSTEM_PATHS:
+    if request.scope["path"] in SYSTEM_PATHS:
         return JSONResponse(
             status_code=422,
             content={
@@ -68,73 +135,49 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 
     error_message = "; ".join(errors) if errors else "Ошибка валидации данных"
 
-    if request.url.path == "/register" or "/register" in str(request.url):
-        template_name = "register.html"
-    elif request.url.path == "/login" or "/login" in str(request.url):
-        template_name = "login.html"
-    elif "/albums" in request.url.path:
-        template_name = "album_detail.html"
-    else:
-        template_name = "error.html"
+    path = request.scope["path"]
+    template_name = next(
+        (name for prefix, name in VALIDATION_ERROR_TEMPLATES if path.startswith(prefix)),
+        "error.html"
+    )
 
-    return templates.TemplateResponse(template_name, {
-        "request": request,
-        "error": error_message,
-        "status_code": 422,
-        "now": datetime.now
-    }, status_code=422)
-
-@app.exception_handler(404)
-async def not_found_handler(request: Request, exc: HTTPException):
-    if request.url.path in SYSTEM_PATHS:
-        return JSONResponse(status_code=404, content={"detail": "Not found"})
+    return render_error(request, 422, error_message, template_name)
 
-    return templates.TemplateResponse("error.html", {
-        "request": request,
-        "error": "Страница не найдена",
-        "status_code": 404,
-        "now": datetime.now
-    }, status_code=404)
-
-@app.exception_handler(HTTPException)
-async def http_exception_handler(request: Request, exc: HTTPException):
-    if request.url.path in SYSTEM_PATHS:
-        return JSONResponse(status_code=404, content={"detail": "Not found"})
+@app.exception_handler(StarletteHTTPException)
+async def http_exception_handler(request: Request, exc: StarletteHTTPException):
+    if exc.status_code == 404:
+        return render_error(request, 404, "Страница не найдена")
 
-    return templates.TemplateResponse("error.html", {
-        "request": request,
-        "error": exc.detail,
-        "status_code": exc.status_code,
-        "now": datetime.now
-    }, status_code=exc.status_code)
+    return render_error(request, exc.status_code, exc.detail)
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"Необработанное исключение: {exc}", exc_info=True)
 
-    if request.url.path in SYSTEM_PATHS:
-        return JSONResponse(status_code=404, content={"detail": "Not found"})
-
     error_message = str(exc)
     if len(error_message) > 200:
         error_message = error_message[:200] + "..."
 
-    return templates.TemplateResponse("error.html", {
-        "request": request,
-        "error": f"Внутренняя ошибка сервера: {error_message}",
-        "status_code": 500,
-        "now": datetime.now
-    }, status_code=500)
+    return render_error(request, 500, f"Внутренняя ошибка сервера: {error_message}")
 
 
 # ===== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ =====
 
-def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)):
+async def get_current_user_from_cookie(request: Request, db: AsyncSession = Depends(get_db)):
+    # Пользователь уже определён в рамках этого запроса
+    if hasattr(request.state, "user"):
+        return request.state.user
+
+    request.state.user = await _resolve_user_from_cookie(request, db)
+    return request.state.user
+
+
+async def _resolve_user_from_cookie(request: Request, db: AsyncSession):
     token = request.cookies.get("access_token")
     if not token:
         return None
 
-    payload = decode_token(token)
+    payload = decode_token_cached(token)
     if not payload:
         return None
 
@@ -142,23 +185,36 @@ def get_current_user_from_cookie(request: Request, db: Session = Depends(get_db)
     if not username:
         return None
 
-    user = db.query(User).filter(User.username == username).first()
-    return user
+    return await get_cached_user(db, username)
 
 
-def authenticate_user(db: Session, username: str, password: str):
-    user = get_user_by_username(db, username)
-    if not user:
-        return None
-    if not verify_password(password, user.hashed_password):
-        return None
-    return user
+def iter_chunks(fragments, chunk_size: int = STREAM_CHUNK_SIZE):
+    buffer = []
+    buffered = 0
+    for fragment in fragments:
+        buffer.append(fragment)
+        buffered += len(fragment)
+        if buffered >= chunk_size:
+            yield "".join(buffer)
+            buffer = []
+            buffered = 0
+
+    if buffer:
+        yield "".join(buffer)
+
+
+def get_current_year() -> int:
+    global _current_year, _next_year_starts_at
+    if time.time() >= _next_year_starts_at:
+        _current_year = datetime.now().year
+        _next_year_starts_at = datetime(_current_year + 1, 1, 1).timestamp()
+    return _current_year
 
 
 def validate_user_registration(email: str, username: str, password: str, confirm_password: str):
     errors = []
 
-    if not email or "@" not in email or "." not in email.split("@")[-1]:
+    if not email or not EMAIL_RE.fullmatch(email):
         errors.append("Некорректный email адрес")
 
     if not username or len(username) < 3:
@@ -191,7 +247,7 @@ def validate_album_data(title: str, artist: str, release_year: Optional[int] = N
         errors.append("Имя исполнителя слишком длинное (максимум 100 символов)")
 
     if release_year is not None:
-        current_year = datetime.now().year
+        current_year = get_current_year()
         if release_year < 1900 or release_year > current_year:
             errors.append(f"Год выпуска должен быть между 1900 и {current_year}")
 
@@ -204,7 +260,7 @@ def validate_album_data(title: str, artist: str, release_year: Optional[int] = N
 async def home_page(request: Request):
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "now": datetime.now
+        "now": datetime.now()
     })
 
 
@@ -214,7 +270,7 @@ async def home_page(request: Request):
 async def login_page(request: Request):
     return templates.TemplateResponse("login.html", {
         "request": request,
-        "now": datetime.now
+        "now": datetime.now()
     })
 
 
@@ -223,19 +279,19 @@ async def login_user(
         request: Request,
         username: str = Form(...),
         password: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = authenticate_user(db, username, password)
-    if not user:
+    user_id = await authenticate_user(db, username, password)
+    if user_id is None:
         return templates.TemplateResponse("login.html", {
             "request": request,
             "error": "Неверное имя пользователя или пароль",
-            "now": datetime.now
+            "now": datetime.now()
         }, status_code=401)
 
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username},
+        data={"sub": username},
         expires_delta=access_token_expires
     )
 
@@ -253,7 +309,7 @@ async def login_user(
 async def register_page(request: Request):
     return templates.TemplateResponse("register.html", {
         "request": request,
-        "now": datetime.now
+        "now": datetime.now()
     })
 
 
@@ -264,7 +320,7 @@ async def register_user(
         username: str = Form(...),
         password: str = Form(...),
         confirm_password: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
 
     validation_errors = validate_user_registration(email, username, password, confirm_password)
@@ -274,27 +330,11 @@ async def register_user(
         return templates.TemplateResponse("register.html", {
             "request": request,
             "error": error_message,
-            "now": datetime.now
+            "now": datetime.now()
         }, status_code=422)
 
-    if get_user_by_email(db, email) or get_user_by_username(db, username):
-        return templates.TemplateResponse("register.html", {
-            "request": request,
-            "error": "Пользователь с таким email или username уже существует",
-            "now": datetime.now
-        }, status_code=400)
-
     try:
-        hashed_password = get_password_hash(password)
-        user = User(
-            email=email,
-            username=username,
-            hashed_password=hashed_password
-        )
-
-        db.add(user)
-        db.commit()
-        db.refresh(user)
+        user = await create_user(db, email, username, password)
 
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         access_token = create_access_token(
@@ -311,13 +351,19 @@ async def register_user(
         )
         return response
 
+    except HTTPException as e:
+        return templates.TemplateResponse("register.html", {
+            "request": request,
+            "error": e.detail,
+            "now": datetime.now()
+        }, status_code=e.status_code)
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Ошибка при регистрации: {e}")
         return templates.TemplateResponse("register.html", {
             "request": request,
             "error": "Произошла ошибка при регистрации",
-            "now": datetime.now
+            "now": datetime.now()
         }, status_code=500)
 
 
@@ -333,33 +379,49 @@ async def logout():
 @app.get("/albums", response_class=HTMLResponse)
 async def albums_page(
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         q: Optional[str] = None
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
+    # Страница не изменилась, пока не менялись альбомы пользователя.
+    # В dev-режиме шаблоны перечитываются на лету, а ALBUMS_PAGE_VERSION
+    # считается один раз при импорте, поэтому ETag не используется
+    headers = {"Cache-Control": "private, no-cache"}
+    if not DEV_MODE:
+        last_updated, count = await get_albums_version(db, user.id)
+        etag = 'W/"' + hashlib.md5(f"{ALBUMS_PAGE_VERSION}:{user.id}:{last_updated}:{count}:{q or ''}".encode()).hexdigest() + '"'
+        headers["ETag"] = etag
+
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
     if q:
-        albums = search_albums(db, user.id, q)
+        albums = await search_albums(db, user.id, q)
     else:
-        albums = get_albums(db, user.id)
+        albums = await get_albums(db, user.id)
 
-    return templates.TemplateResponse("albums.html", {
+    # Страница отдаётся по мере рендеринга, не дожидаясь всего HTML;
+    # фрагменты Jinja склеиваются в крупные блоки, чтобы не делать
+    # отдельный send (и переход в threadpool) на каждый фрагмент
+    template = templates.get_template("albums.html")
+    return StreamingResponse(iter_chunks(template.generate({
         "request": request,
         "user": user,
         "albums": albums,
         "search_query": q or "",
-        "now": datetime.now
-    })
+        "now": datetime.now()
+    })), media_type="text/html", headers=headers)
 
 
 @app.get("/albums/new", response_class=HTMLResponse)
 async def new_album_page(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -368,7 +430,7 @@ async def new_album_page(
         "user": user,
         "album": None,
         "action": "new",
-        "now": datetime.now
+        "now": datetime.now()
     })
 
 
@@ -384,9 +446,9 @@ async def create_new_album(
         condition: Optional[str] = Form(None),
         barcode: Optional[str] = Form(None),
         notes: Optional[str] = Form(None),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -410,7 +472,7 @@ async def create_new_album(
             },
             "action": "new",
             "error": error_message,
-            "now": datetime.now
+            "now": datetime.now()
         }, status_code=422)
 
     try:
@@ -428,7 +490,7 @@ async def create_new_album(
 
         album_data = {k: v for k, v in album_data.items() if v is not None}
 
-        album = create_album(db, user.id, **album_data)
+        album = await create_album(db, user.id, **album_data)
 
         return RedirectResponse(url=f"/albums/{album.id}", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -450,7 +512,7 @@ async def create_new_album(
             },
             "action": "new",
             "error": "Ошибка при создании альбома",
-            "now": datetime.now
+            "now": datetime.now()
         }, status_code=500)
 
 
@@ -458,28 +520,23 @@ async def create_new_album(
 async def album_detail_page(
         request: Request,
         album_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
     try:
-        album = get_album_by_id(db, album_id, user.id)
+        album = await get_album_by_id(db, album_id, user.id)
         return templates.TemplateResponse("album_detail.html", {
             "request": request,
             "user": user,
             "album": album,
             "action": "edit",
-            "now": datetime.now
+            "now": datetime.now()
         })
-    except HTTPException as e:
-        return templates.TemplateResponse("error.html", {
-            "request": request,
-            "error": "Альбом не найден",
-            "status_code": 404,
-            "now": datetime.now
-        }, status_code=404)
+    except HTTPException:
+        return render_error(request, 404, "Альбом не найден")
 
 
 @app.post("/albums/{album_id}/edit", response_class=HTMLResponse)
@@ -495,9 +552,9 @@ async def edit_album(
         condition: Optional[str] = Form(None),
         barcode: Optional[str] = Form(None),
         notes: Optional[str] = Form(None),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -522,7 +579,7 @@ async def edit_album(
             },
             "action": "edit",
             "error": error_message,
-            "now": datetime.now
+            "now": datetime.now()
         }, status_code=422)
 
     try:
@@ -540,17 +597,12 @@ async def edit_album(
 
         album_data = {k: v for k, v in album_data.items() if v is not None}
 
-        album = update_album(db, album_id, user.id, **album_data)
+        album = await update_album(db, album_id, user.id, **album_data)
 
         return RedirectResponse(url=f"/albums/{album.id}", status_code=status.HTTP_303_SEE_OTHER)
 
     except HTTPException as e:
-        return templates.TemplateResponse("error.html", {
-            "request": request,
-            "error": e.detail,
-            "status_code": e.status_code,
-            "now": datetime.now
-        }, status_code=e.status_code)
+        return render_error(request, e.status_code, e.detail)
     except Exception as e:
         logger.error(f"Ошибка при обновлении альбома: {e}")
         return templates.TemplateResponse("album_detail.html", {
@@ -570,7 +622,7 @@ async def edit_album(
             },
             "action": "edit",
             "error": "Ошибка при обновлении альбома",
-            "now": datetime.now
+            "now": datetime.now()
         }, status_code=500)
 
 
@@ -578,14 +630,14 @@ async def edit_album(
 async def delete_album_endpoint(
         request: Request,
         album_id: int,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         return RedirectResponse(url="/login", status_code=status.HTTP_303_SEE_OTHER)
 
     try:
-        delete_album(db, album_id, user.id)
+        await delete_album(db, album_id, user.id)
         return RedirectResponse(url="/albums", status_code=status.HTTP_303_SEE_OTHER)
     except Exception as e:
         logger.error(f"Ошибка при удалении альбома: {e}")
@@ -602,9 +654,9 @@ async def health_check():
 @app.get("/api/me")
 async def get_current_user_info(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = get_current_user_from_cookie(request, db)
+    user = await get_current_user_from_cookie(request, db)
     if not user:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
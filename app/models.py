@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index, desc, func, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -18,6 +18,21 @@ class User(Base):
 
 class Album(Base):
     __tablename__ = "albums"
+    __table_args__ = (
+        # Триграммные индексы для ILIKE '%q%' в search_albums
+        Index("ix_albums_title_trgm", "title", postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_albums_artist_trgm", "artist", postgresql_using="gin",
+              postgresql_ops={"artist": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        Index("ix_albums_genre_trgm", "genre", postgresql_using="gin",
+              postgresql_ops={"genre": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        # Список альбомов пользователя: WHERE owner_id = ? ORDER BY created_at DESC
+        Index("ix_albums_owner_created", "owner_id", desc("created_at")),
+        # Карточка альбома: WHERE id = ? AND owner_id = ?
+        Index("ix_albums_owner_id", "owner_id", "id"),
+        # Версия коллекции для ETag: max(updated_at), count(*) по owner_id
+        Index("ix_albums_owner_updated", "owner_id", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String(200), nullable=False)
@@ -30,6 +45,22 @@ class Album(Base):
     barcode = Column(String(50))
     notes = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     owner_id = Column(Integer, ForeignKey("users.id"))
-    owner = relationship("User", back_populates="albums")
\ No newline at end of file
+    owner = relationship("User", back_populates="albums")
+
+
+# Полнотекстовый документ альбома: название + исполнитель + жанр.
+# Константы рендерятся литералами, чтобы выражение в запросе совпадало
+# с выражением GIN-индекса и планировщик мог его использовать.
+SEARCH_CONFIG = text("'simple'")
+
+album_search_vector = func.to_tsvector(
+    SEARCH_CONFIG,
+    func.coalesce(Album.title, text("''")) + text("' '")
+    + func.coalesce(Album.artist, text("''")) + text("' '")
+    + func.coalesce(Album.genre, text("''"))
+)
+
+Index("ix_albums_search_tsv", album_search_vector, postgresql_using="gin").ddl_if(dialect="postgresql")
\ No newline at end of file
@@ -0,0 +1,73 @@
+import asyncio
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import Column, pool
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.database import DATABASE_URL, Base
+from app import models  # noqa: F401 — регистрирует таблицы в Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Исключает из autogenerate индексы, которые сравнить нельзя:
+    индексы другой СУБД (ddl_if) и индексы по выражениям / DESC,
+    созданные миграциями вручную"""
+    if type_ != "index":
+        return True
+
+    index = compare_to if reflected else object
+    if index is None:
+        return True
+
+    ddl_if = getattr(index, "_ddl_if", None)
+    if ddl_if is not None and ddl_if.dialect not in (None, context.get_context().dialect.name):
+        return False
+
+    return all(isinstance(expression, Column) for expression in index.expressions)
+
+
+def run_migrations_offline():
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        include_object=include_object
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(DATABASE_URL, poolclass=pool.NullPool)
+
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
@@ -0,0 +1,92 @@
+"""initial schema
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-15 01:06:31.486572
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_COLUMNS = ('title', 'artist', 'genre')
+
+
+def upgrade() -> None:
+    # Базы, созданные раньше через Base.metadata.create_all, уже содержат
+    # таблицы и часть индексов: создаём только то, чего не хватает
+    bind = op.get_bind()
+    is_postgresql = bind.dialect.name == 'postgresql'
+    existing_tables = set(sa.inspect(bind).get_table_names())
+
+    def create_index_if_missing(name, table, columns, **kw):
+        if name not in {index['name'] for index in sa.inspect(bind).get_indexes(table)}:
+            op.create_index(name, table, columns, **kw)
+
+    if is_postgresql:
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    if 'users' not in existing_tables:
+        op.create_table('users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('email', sa.String(length=100), nullable=False),
+        sa.Column('username', sa.String(length=50), nullable=False),
+        sa.Column('hashed_password', sa.String(length=255), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+        )
+    create_index_if_missing(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    create_index_if_missing(op.f('ix_users_id'), 'users', ['id'], unique=False)
+    create_index_if_missing(op.f('ix_users_username'), 'users', ['username'], unique=True)
+
+    if 'albums' not in existing_tables:
+        op.create_table('albums',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('title', sa.String(length=200), nullable=False),
+        sa.Column('artist', sa.String(length=100), nullable=False),
+        sa.Column('genre', sa.String(length=50), nullable=True),
+        sa.Column('release_year', sa.Integer(), nullable=True),
+        sa.Column('record_label', sa.String(length=100), nullable=True),
+        sa.Column('country', sa.String(length=50), nullable=True),
+        sa.Column('condition', sa.String(length=50), nullable=True),
+        sa.Column('barcode', sa.String(length=50), nullable=True),
+        sa.Column('notes', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('owner_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['owner_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('id')
+        )
+    create_index_if_missing(op.f('ix_albums_id'), 'albums', ['id'], unique=False)
+    create_index_if_missing('ix_albums_owner_created', 'albums', ['owner_id', sa.text('created_at DESC')], unique=False)
+
+    if is_postgresql:
+        for column in SEARCH_COLUMNS:
+            create_index_if_missing(f'ix_albums_{column}_trgm', 'albums', [column], unique=False,
+                                    postgresql_using='gin', postgresql_ops={column: 'gin_trgm_ops'})
+        create_index_if_missing('ix_albums_search_tsv', 'albums', [sa.text(
+            "to_tsvector('simple', coalesce(title, '') || ' ' || coalesce(artist, '') || ' ' || coalesce(genre, ''))"
+        )], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == 'postgresql':
+        op.drop_index('ix_albums_search_tsv', table_name='albums')
+        for column in SEARCH_COLUMNS:
+            op.drop_index(f'ix_albums_{column}_trgm', table_name='albums')
+
+    op.drop_index('ix_albums_owner_created', table_name='albums')
+    op.drop_index(op.f('ix_albums_id'), table_name='albums')
+    op.drop_table('albums')
+    op.drop_index(op.f('ix_users_username'), table_name='users')
+    op.drop_index(op.f('ix_users_id'), table_name='users')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
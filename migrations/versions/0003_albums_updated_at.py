@@ -0,0 +1,27 @@
+"""albums updated_at
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-15 01:19:07.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('albums', sa.Column('updated_at', sa.DateTime(), nullable=True))
+    op.execute('UPDATE albums SET updated_at = created_at')
+
+
+def downgrade() -> None:
+    op.drop_column('albums', 'updated_at')
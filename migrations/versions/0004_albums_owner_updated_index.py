@@ -0,0 +1,26 @@
+"""albums owner_id, updated_at index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-15 02:41:18.930562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_albums_owner_updated', 'albums', ['owner_id', 'updated_at'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_albums_owner_updated', table_name='albums')